@@ -10,7 +10,7 @@ try:
     from modules.CleanPath import CleanPath
     from modules.CollectionPosterMaker import CollectionPosterMaker
     from modules.Debug import log
-    from modules.GenreMaker import GenreMaker
+    from modules.GenreMaker import GenreMaker, create_many as create_genre_cards
     from modules.MoviePosterMaker import MoviePosterMaker
     from modules.PreferenceParser import PreferenceParser
     from modules.global_objects import set_preference_parser
@@ -289,6 +289,11 @@ genre_group.add_argument(
     metavar=('SOURCE_DIRECTORY'),
     help='Create all genre cards for images in the given directory based on '
          'their file names')
+genre_group.add_argument(
+    '--force-genre-card',
+    action='store_true',
+    help='Recreate genre cards even if they were created from identical '
+         'inputs')
 
 # Argument group for show summaries
 show_summary_group = parser.add_argument_group(
@@ -501,19 +506,21 @@ if hasattr(args, 'genre_card'):
         font_size=float(args.font_size[:-1])/100.0,
         borderless=args.borderless,
         omit_gradient=args.no_gradient,
-    ).create()
+    ).create(force=args.force_genre_card)
 
 if hasattr(args, 'genre_card_batch'):
-    for file in args.genre_card_batch.glob('*'):
-        if file.suffix.lower() in GenreMaker.VALID_IMAGE_EXTENSIONS:
-            GenreMaker(
-                source=file,
-                genre=file.stem.upper(),
-                output=file.with_stem(f'{file.stem}-GenreCard'),
-                font_size=float(args.font_size[:-1])/100.0,
-                borderless=args.borderless,
-                omit_gradient=args.no_gradient,
-            ).create()
+    create_genre_cards([
+        GenreMaker(
+            source=file,
+            genre=file.stem.upper(),
+            output=file.with_stem(f'{file.stem}-GenreCard'),
+            font_size=float(args.font_size[:-1])/100.0,
+            borderless=args.borderless,
+            omit_gradient=args.no_gradient,
+        )
+        for file in args.genre_card_batch.glob('*')
+        if file.suffix.lower() in GenreMaker.VALID_IMAGE_EXTENSIONS
+    ], force=args.force_genre_card)
 
 # Create show summaries
 if hasattr(args, 'show_summary'):
@@ -1,4 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from os import cpu_count
 from pathlib import Path
+from typing import Iterable, Optional
 
 from modules.BaseCardType import ImageMagickCommands
 from modules.Debug import log
@@ -17,9 +21,13 @@ class GenreMaker(ImageMaker):
 
     """Base font for genre text"""
     FONT = REF_DIRECTORY / 'MyriadRegular.ttf'
+    __FONT = str(FONT.resolve())
 
     """Base gradient image to overlay over source image"""
-    __GENRE_GRADIENT = REF_DIRECTORY / 'genre_gradient.png'
+    __GENRE_GRADIENT = str((REF_DIRECTORY / 'genre_gradient.png').resolve())
+
+    """Suffix of the file (next to the output) storing the inputs' key"""
+    KEY_FILE_SUFFIX = '.genrekey'
 
 
     def __init__(self,
@@ -42,6 +50,46 @@ class GenreMaker(ImageMaker):
         self.borderless = borderless
         self.omit_gradient = omit_gradient
 
+        # Resolve paths once for use in commands
+        self.__source = str(source.resolve())
+        self.__output = str(output.resolve())
+        self.__key_file = output.with_name(output.name + self.KEY_FILE_SUFFIX)
+
+
+    def __input_key(self, command: list[str]) -> str:
+        """
+        Key (hash) of all the inputs of this card - i.e. the command
+        used to create it, the source image, and the reference files.
+        Two cards with the same key produce the same image.
+
+        Args:
+            command: Command (as arguments) used to create this card.
+
+        Returns:
+            Hex digest of all the inputs.
+        """
+
+        source = self.source.stat()
+        return sha256('\0'.join((
+            *command,
+            str(source.st_mtime_ns), str(source.st_size),
+            str(self.FONT.stat().st_mtime_ns),
+            str(Path(self.__GENRE_GRADIENT).stat().st_mtime_ns),
+        )).encode()).hexdigest()
+
+
+    def __is_unchanged(self, key: str) -> bool:
+        """
+        Whether the output of this card already exists and was created
+        from inputs with the given key.
+        """
+
+        try:
+            return (self.output.exists()
+                    and self.__key_file.read_text(encoding='utf-8') == key)
+        except OSError:
+            return False
+
 
     @property
     def gradient_commands(self) -> ImageMagickCommands:
@@ -53,9 +101,9 @@ class GenreMaker(ImageMaker):
             return []
 
         return [
-            f'"{self.__GENRE_GRADIENT.resolve()}"',
-            f'-gravity south',
-            f'-composite',
+            self.__GENRE_GRADIENT,
+            '-gravity', 'south',
+            '-composite',
         ]
 
 
@@ -67,49 +115,89 @@ class GenreMaker(ImageMaker):
             return []
 
         return [
-            f'-gravity center',
-            f'-bordercolor white',
-            f'-border 27x27',
+            '-gravity', 'center',
+            '-bordercolor', 'white',
+            '-border', '27x27',
         ]
 
 
-    def create(self) -> None:
+    def create(self, force: bool = False) -> None:
         """
         Create the genre card. This WILL overwrite the existing file if
-        it  already exists. Errors and returns if the source image does
-        not exist.
+        it  already exists, unless that file was created from identical
+        inputs. Errors and returns if the source image does not exist.
+
+        Args:
+            force: Whether to recreate the card even if the existing
+                file was created from identical inputs.
         """
 
         # If the source file doesn't exist, exit
         if not self.source.exists():
-            log.error(f'Cannot create genre card - "{self.source.resolve()}" '
+            log.error(f'Cannot create genre card - "{self.__source}" '
                       f'does not exist.')
             return None
 
-        # Create the output directory and any necessary parents
-        self.output.parent.mkdir(parents=True, exist_ok=True)
-
-        # Command to create genre poster
-        command = ' '.join([
+        # Command (as arguments) to create genre poster
+        command = [
             # Resize source image
-            f'convert "{self.source.resolve()}"',
-            f'-background transparent',
-            f'-resize "946x1446^"',
-            f'-gravity center',
-            f'-extent "946x1446"',
+            'convert', self.__source,
+            '-background', 'transparent',
+            '-resize', '946x1446^',
+            '-gravity', 'center',
+            '-extent', '946x1446',
             # Optionally add gradient
             *self.gradient_commands,
             # Add border
             *self.border_commands,
             # Add genre text
-            f'-font "{self.FONT.resolve()}"',
-            f'-fill white',
-            f'-pointsize {self.font_size * 159.0}',
-            f'-kerning 2.25',
-            f'-interline-spacing -40',
-            f'-annotate +0+564 "{self.genre}"',
-            f'"{self.output.resolve()}"',
-        ])
-
-        self.image_magick.run(command)
+            '-font', self.__FONT,
+            '-fill', 'white',
+            '-pointsize', f'{self.font_size * 159.0}',
+            '-kerning', '2.25',
+            '-interline-spacing', '-40',
+            '-annotate', '+0+564', self.genre,
+            self.__output,
+        ]
+
+        # If the existing card was made from identical inputs, skip
+        key = self.__input_key(command)
+        if not force and self.__is_unchanged(key):
+            log.info(f'Genre card "{self.__output}" is unchanged - skipping')
+            return None
+
+        # Create the output directory and any necessary parents
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        old_mtime = self.output.stat().st_mtime_ns \
+            if self.output.exists() else None
+
+        self.image_magick.run(command, capture=False)
+
+        # Record the key of the inputs if the card was (re)created
+        if (self.output.exists()
+            and self.output.stat().st_mtime_ns != old_mtime):
+            self.__key_file.write_text(key, encoding='utf-8')
+
         return None
+
+
+def create_many(
+        makers: Iterable[GenreMaker],
+        workers: Optional[int] = None,
+        force: bool = False,
+    ) -> None:
+    """
+    Create all the given genre cards in parallel. Threads are used as
+    all work is done in ImageMagick subprocesses.
+
+    Args:
+        makers: GenreMaker objects to create the cards of.
+        workers: Maximum number of cards to create at once. If omitted,
+            the number of CPUs is used.
+        force: Whether to recreate cards whose existing files were
+            created from identical inputs.
+    """
+
+    with ThreadPoolExecutor(max_workers=workers or cpu_count()) as executor:
+        for _ in executor.map(lambda maker: maker.create(force), makers):
+            pass
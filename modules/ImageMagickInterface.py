@@ -1,8 +1,11 @@
-from os import environ, name as os_name
+from os import environ, name as os_name, unlink
 from pathlib import Path
-from shlex import split as command_split
-from subprocess import Popen, PIPE, TimeoutExpired
-from typing import Literal, NamedTuple, Optional, overload
+from queue import Empty, Queue
+from shlex import join as command_join, split as command_split
+from subprocess import DEVNULL, Popen, PIPE, STDOUT, TimeoutExpired
+from threading import Thread, local
+from time import monotonic
+from typing import Literal, NamedTuple, Optional, Union, overload
 
 from imagesize import get as im_get
 
@@ -14,6 +17,129 @@ class Dimensions(NamedTuple): # pylint: disable=missing-class-docstring
     height: float
 
 
+class DockerShell:
+    """
+    This class describes a persistent shell running within a docker
+    container. Commands are written to the stdin of the shell, and their
+    output is read until a sentinel line is echoed back. This means the
+    cost of attaching to the container (`docker exec`) is only paid once
+    per shell, rather than once per command.
+    """
+
+    """Line echoed after each command to mark the end of its output"""
+    SENTINEL = b'__TCM_COMMAND_DONE__'
+
+    __slots__ = ('container', 'commands_completed', '__process', '__output')
+
+
+    def __init__(self, container: str) -> None:
+        """
+        Start a new shell in the given container.
+
+        Args:
+            container: Docker container name/ID to start the shell in.
+
+        Raises:
+            OSError if docker cannot be executed.
+        """
+
+        self.container = container
+        self.commands_completed = 0
+        self.__process = None
+        self.__process = Popen(
+            ['docker', 'exec', '-i', container, 'sh'],
+            stdin=PIPE, stdout=PIPE, stderr=STDOUT,
+        )
+
+        # Read output on a separate thread so commands can time out
+        self.__output = Queue()
+        Thread(target=self.__read_output, daemon=True).start()
+
+
+    def __del__(self) -> None:
+        """Terminate the shell when this object is garbage collected."""
+
+        self.close()
+
+
+    def __read_output(self) -> None:
+        """Read all lines from the shell, finishing with None at EOF."""
+
+        for line in iter(self.__process.stdout.readline, b''):
+            self.__output.put(line)
+        self.__output.put(None)
+
+
+    @property
+    def alive(self) -> bool:
+        """Whether this shell is still running."""
+
+        return self.__process is not None and self.__process.poll() is None
+
+
+    def close(self) -> None:
+        """Close this shell, terminating it if it has not yet exited."""
+
+        if self.alive:
+            try:
+                self.__process.stdin.close()
+            except OSError:
+                pass
+            self.__process.terminate()
+
+
+    def run(self,
+            command: list[str],
+            timeout: float,
+            capture: bool = True,
+        ) -> bytes:
+        """
+        Run the given command in this shell.
+
+        Args:
+            command: The command (as a list of arguments) to execute.
+            timeout: How many seconds to wait for the command to finish.
+            capture: Whether to capture the output of the command. If
+                False, the output is discarded within the container.
+
+        Returns:
+            The combined STDOUT and STDERR of the executed command.
+
+        Raises:
+            OSError or ValueError if the shell has exited.
+            TimeoutExpired if the command did not finish in time. The
+                shell is closed in this case.
+        """
+
+        # Write command, then echo sentinel on its own line. The command
+        # cannot read stdin, as that is where later commands are written
+        redirect = '2>&1' if capture else '>/dev/null 2>&1'
+        self.__process.stdin.write(
+            f'{command_join(command)} </dev/null {redirect}; echo; echo '.encode()
+            + self.SENTINEL + b'\n'
+        )
+        self.__process.stdin.flush()
+
+        # Read output until the sentinel is encountered
+        output, deadline = [], monotonic() + timeout
+        while True:
+            try:
+                line = self.__output.get(timeout=max(deadline - monotonic(), 0))
+            except Empty as exc:
+                self.close()
+                raise TimeoutExpired(command, timeout) from exc
+
+            if line is None:
+                raise BrokenPipeError(f'Shell in {self.container} exited')
+            if line.rstrip() == self.SENTINEL:
+                break
+            output.append(line)
+
+        # Remove the newline echoed before the sentinel
+        self.commands_completed += 1
+        return b''.join(output)[:-1]
+
+
 class ImageMagickInterface:
     """
     This class describes an interface to ImageMagick. If initialized
@@ -39,12 +165,23 @@ class ImageMagickInterface:
     """Temporary file location for svg -> png conversion"""
     TEMPORARY_SVG_FILE = TEMP_DIR / 'temp_logo.svg'
 
-    """Characters that must be escaped in commands"""
-    __REQUIRED_ESCAPE_CHARACTERS = ('"', '`', '%', '\\')
+    """
+    Translation of characters that must be escaped in commands. Each is
+    escaped with a backslash, and then all backslashes are escaped.
+    """
+    __ESCAPE_TRANSLATION = str.maketrans({
+        '"': r'\\"', '`': r'\\`', '%': r'\\%', '\\': r'\\',
+    })
 
     """Substrings that must be present in --version output"""
     __REQUIRED_VERSION_SUBSTRINGS = ('Version','Copyright','License','Features')
 
+    """Persistent docker shells (per container) for each thread"""
+    __shells = local()
+
+    """Containers for which a persistent shell could not be started or used"""
+    __unavailable_containers: set[str] = set()
+
     __slots__ = ('container', 'use_docker', 'prefix', 'timeout', '__history')
 
 
@@ -115,50 +252,135 @@ class ImageMagickInterface:
         if string is None:
             return None
 
-        for char in ImageMagickInterface.__REQUIRED_ESCAPE_CHARACTERS:
-            string = string.replace(char, f'\{char}')
+        return string.translate(ImageMagickInterface.__ESCAPE_TRANSLATION)
 
-        return string
 
+    def __get_shell(self) -> Optional[DockerShell]:
+        """
+        Get the persistent shell for this interface's container in the
+        current thread, starting one if there is no running shell.
 
-    def run(self, command: str) -> tuple[bytes, bytes]:
+        Returns:
+            The DockerShell for this container. None if a shell could
+            not be started.
+        """
+
+        if not hasattr(self.__shells, 'by_container'):
+            self.__shells.by_container = {}
+
+        if self.container in self.__unavailable_containers:
+            return None
+
+        shell = self.__shells.by_container.get(self.container)
+        if shell is None or not shell.alive:
+            try:
+                shell = DockerShell(self.container)
+            except OSError:
+                log.debug(f'Cannot start shell in container {self.container}')
+                self.__unavailable_containers.add(self.container)
+                return None
+            self.__shells.by_container[self.container] = shell
+
+        return shell
+
+
+    def run(self,
+            command: Union[str, list[str]],
+            capture: bool = True,
+        ) -> tuple[bytes, bytes]:
         """
         Wrapper for running a given command. This uses either the host
         machine (i.e. direct calls); or through the provided docker
-        container (if preferences has been set; i.e. wrapped through
-        "docker exec -t {id} {command}").
+        container (if preferences has been set). Docker commands are
+        written to a persistent shell in that container, falling back to
+        "docker exec -t {id} {command}" if that shell is unavailable.
 
         Args:
-            command: The command (as string) to execute.
+            command: The command to execute. Either a string which is
+                split into arguments, or a list of (unquoted) arguments
+                which is used directly.
+            capture: Whether to capture the output of the command. If
+                False, the output is discarded and empty output is
+                returned.
 
         Returns:
             Tuple of the STDOUT and STDERR of the executed command.
         """
 
-        # Un-escape \( and \) into ( and )
-        if os_name == 'nt':
-            command = command.replace('\(', '(').replace('\)', ')')
-
-        # If a docker image ID is specified, execute the command in that container
-        # otherwise, execute on the host machine (no docker wrapper)
-        if self.use_docker:
-            command = f'docker exec -t {self.container} {self.prefix}{command}'
+        # Command is already a list of arguments, no need to split
+        if isinstance(command, list):
+            cmd = [*self.prefix.split(), *command]
+            command = command_join(cmd)
         else:
+            # Un-escape \( and \) into ( and )
+            if os_name == 'nt':
+                command = command.replace('\(', '(').replace('\)', ')')
+
+            # Split command into list of strings for Popen
             command = f'{self.prefix}{command}'
+            try:
+                cmd = command_split(command)
+            except ValueError as exc:
+                log.exception(f'Invalid ImageMagick command', exc)
+                log.debug(command)
+                return b'', b''
+
+        # If a docker image ID is specified, execute the command in that
+        # container's persistent shell
+        stdout, stderr = b'', b''
+        shell = self.__get_shell() if self.use_docker else None
+        if shell is not None:
+            try:
+                stdout = shell.run(cmd, self.timeout, capture)
+            except TimeoutExpired:
+                log.error(f'ImageMagick command timed out')
+                log.debug(command)
+            except (OSError, ValueError):
+                log.debug(f'Docker shell unavailable - executing directly')
+                # Shell never worked (e.g. container lacks sh), do not retry
+                if shell.commands_completed == 0:
+                    self.__unavailable_containers.add(self.container)
+                shell = None
+
+        # No shell, execute in the docker container or on the host machine
+        if shell is None:
+            if self.use_docker:
+                command = f'docker exec -t {self.container} {command}'
+                cmd = ['docker', 'exec', '-t', self.container, *cmd]
+            stdout, stderr = self.__run_process(cmd, command, capture)
 
-        # Split command into list of strings for Popen
-        try:
-            cmd = command_split(command)
-        except ValueError as exc:
-            log.exception(f'Invalid ImageMagick command', exc)
-            log.debug(command)
-            return b'', b''
+        # Add command to history and return results
+        self.__history.append((command, stdout, stderr))
+
+        return stdout, stderr
+
+
+    def __run_process(self,
+            cmd: list[str],
+            command: str,
+            capture: bool,
+        ) -> tuple[bytes, bytes]:
+        """
+        Run the given command in a new process.
 
-        # Execute, capturing stdout and stderr
+        Args:
+            cmd: The command (as a list of arguments) to execute.
+            command: The command as string, for logging.
+            capture: Whether to capture the output of the command.
+
+        Returns:
+            Tuple of the STDOUT and STDERR of the executed command.
+        """
+
+        # Execute, capturing stdout and stderr if indicated
         stdout, stderr = b'', b''
+        output = PIPE if capture else DEVNULL
         try:
-            with Popen(cmd, stdout=PIPE, stderr=PIPE) as process:
-                stdout, stderr = process.communicate(timeout=self.timeout)
+            with Popen(cmd, stdout=output, stderr=output) as process:
+                if capture:
+                    stdout, stderr = process.communicate(timeout=self.timeout)
+                else:
+                    process.wait(timeout=self.timeout)
         except TimeoutExpired:
             log.error(f'ImageMagick command timed out')
             log.debug(command)
@@ -166,9 +388,6 @@ class ImageMagickInterface:
             log.exception(f'Command error', e)
             log.debug(command)
 
-        # Add command to history and return results
-        self.__history.append((command, stdout, stderr))
-
         return stdout, stderr
 
 
@@ -191,17 +410,21 @@ class ImageMagickInterface:
             return b''.join(output).decode('iso8859')
 
 
-    def delete_intermediate_images(self, *paths: Path) -> None:
+    def delete_intermediate_images(self, *paths: Union[Path, str]) -> None:
         """
         Delete all the provided intermediate files.
 
         Args:
-            paths: Any number of files to delete. Must be Path objects.
+            paths: Any number of files to delete. Can be Path objects or
+                strings.
         """
 
-        # Delete (unlink) each image, don't raise FileNotFoundError if DNE
+        # Delete (unlink) each image, ignore images that DNE
         for image in paths:
-            image.unlink(missing_ok=True)
+            try:
+                unlink(image)
+            except FileNotFoundError:
+                pass
 
 
     def print_command_history(self) -> None:
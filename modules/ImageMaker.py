@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
 from collections import namedtuple
 from pathlib import Path
-from re import findall
+from re import compile as re_compile, findall
+from threading import Lock
 from typing import TYPE_CHECKING, Iterable, Literal, Optional
 
 from modules import global_objects
@@ -45,6 +46,19 @@ class ImageMaker(ABC):
     """
     VALID_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tiff', '.gif', '.webp')
 
+    """Maximum number of text dimensions to keep cached"""
+    TEXT_DIMENSIONS_CACHE_SIZE = 4096
+
+    """Regex to extract the (optionally quoted) fonts used in a command"""
+    __FONT_REGEX = re_compile(r'-font\s+(?:"([^"]*)"|(\S+))')
+
+    """
+    Measured text dimensions, keyed by text command, the modification
+    times of its fonts, and the width/height mode
+    """
+    __text_dimensions = {}
+    __text_dimensions_lock = Lock()
+
     __slots__ = ('preferences', 'image_magick')
 
 
@@ -73,6 +87,26 @@ class ImageMaker(ABC):
             )
 
 
+    @staticmethod
+    def __font_mtime(font: tuple[str, str]) -> Optional[int]:
+        """
+        Get the modification time of the given font file.
+
+        Args:
+            font: Quoted and unquoted font name match, as produced by
+                the font regex. One of these is blank.
+
+        Returns:
+            Modification time (in nanoseconds) of the font file. None if
+            the font is not a file (e.g. a font name).
+        """
+
+        try:
+            return Path(font[0] or font[1]).stat().st_mtime_ns
+        except (OSError, ValueError):
+            return None
+
+
     def get_text_dimensions(self,
             text_command: list[str],
             *,
@@ -104,33 +138,57 @@ class ImageMaker(ABC):
             Dimensions namedtuple.
         """
 
+        # Return previously measured dimensions of identical text; font
+        # times are included so fonts modified in place are re-measured
+        joined_command = ' '.join(text_command)
+        key = (
+            joined_command,
+            tuple(map(self.__font_mtime,
+                      self.__FONT_REGEX.findall(joined_command))),
+            width, height,
+        )
+        if (dimensions := self.__text_dimensions.get(key)) is not None:
+            return dimensions
+
         text_command = ' '.join([
             f'convert',
             f'-debug annotate',
-            f'' if '-annotate ' in ' '.join(text_command) else f'xc: ',
+            f'' if '-annotate ' in joined_command else f'xc: ',
             *text_command,
             f'null: 2>&1',
         ])
 
         # Execute dimension command, parse output
         metrics = self.image_magick.run_get_output(text_command)
-        widths = map(int, findall(r'Metrics:.*width:\s+(\d+)', metrics))
-        heights = map(int, findall(r'Metrics:.*height:\s+(\d+)', metrics))
-
-        try:
-            # Label text produces duplicate Metrics
-            def sum_(v: Iterable[float]) -> float:
-                return sum(v) // (2 if ' label:"' in text_command else 1)
-
-            # Process according to given methods
-            return Dimensions(
-                sum_(widths)  if width  == 'sum' else max(widths),
-                sum_(heights) if height == 'sum' else max(heights),
-            )
-        except ValueError as e:
-            log.debug(f'Cannot identify text dimensions - {e}')
+        widths = [int(_) for _ in findall(r'Metrics:.*width:\s+(\d+)', metrics)]
+        heights = [
+            int(_) for _ in findall(r'Metrics:.*height:\s+(\d+)', metrics)
+        ]
+
+        # No metrics (e.g. the command failed), do not cache this failure
+        if not widths or not heights:
+            log.debug(f'Cannot identify text dimensions - no metrics')
             return Dimensions(0, 0)
 
+        # Label text produces duplicate Metrics
+        def sum_(v: Iterable[float]) -> float:
+            return sum(v) // (2 if ' label:"' in text_command else 1)
+
+        # Process according to given methods
+        dimensions = Dimensions(
+            sum_(widths)  if width  == 'sum' else max(widths),
+            sum_(heights) if height == 'sum' else max(heights),
+        )
+
+        # Cache these dimensions, evicting the oldest if the cache is full
+        with self.__text_dimensions_lock:
+            cache = self.__text_dimensions
+            if len(cache) >= self.TEXT_DIMENSIONS_CACHE_SIZE:
+                cache.pop(next(iter(cache)))
+            cache[key] = dimensions
+
+        return dimensions
+
 
     @staticmethod
     def reduce_file_size(image: Path, quality: int = 90) -> Path:
@@ -1,11 +1,21 @@
 # pylint: disable=dangerous-default-value
+from os import replace
 from pathlib import Path
+from shutil import copymode
 from sys import exit as sys_exit
 from typing import Iterable, Literal, Optional
+try:
+    from os import chown
+except ImportError:
+    chown = None
 
 from ruamel.yaml import YAML, round_trip_dump, comments
 from ruamel.yaml.constructor import DuplicateKeyError
-from yaml import add_representer, dump
+from yaml import add_representer, dump, load
+try:
+    from yaml import CDumper as Dumper, CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import Dumper, SafeLoader
 
 from modules.CleanPath import CleanPath
 from modules.Debug import log
@@ -18,6 +28,23 @@ from modules.SyncInterface import SyncInterface
 SeriesYaml = dict[str, dict[str, str]]
 SyncMode = Literal['append', 'match']
 
+
+class ExclusionLoader(SafeLoader): # pylint: disable=too-many-ancestors
+    """
+    YAML loader for exclusion files. Unlike a plain SafeLoader (YAML
+    1.1), booleans and numbers are not resolved, so series names like
+    Yes or 1.10 are loaded exactly as written.
+    """
+
+    yaml_implicit_resolvers = {
+        char: [
+            (tag, regexp) for tag, regexp in resolvers
+            if tag not in ('tag:yaml.org,2002:bool', 'tag:yaml.org,2002:int',
+                           'tag:yaml.org,2002:float')
+        ] for char, resolvers in SafeLoader.yaml_implicit_resolvers.items()
+    }
+
+
 class SeriesYamlWriter:
     """
     This class describes a SeriesYamlWriter. This is an object that
@@ -28,6 +55,9 @@ class SeriesYamlWriter:
     """Keyword arguments for yaml.dump()"""
     __WRITE_OPTIONS = {'allow_unicode': True, 'width': 250}
 
+    """Round-trip parser for existing series YAML files"""
+    __ROUND_TRIP_YAML = YAML(typ='rt')
+
 
     def __init__(self,
             file: CleanPath,
@@ -95,12 +125,22 @@ class SeriesYamlWriter:
             return dumper.represent_mapping(
                 'tag:yaml.org,2002:map', data, flow_style=True
             )
-        add_representer(flowmap, flowmap_rep)
+        add_representer(flowmap, flowmap_rep, Dumper=Dumper)
         self.__compact_flowmap = flowmap
 
         # Create this file's parent folders
         self.file.parent.mkdir(parents=True, exist_ok=True)
 
+        # Previously converted paths - the conversion never changes
+        self.__converted_paths = {}
+
+        # Modification time and excluded series names of each exclusion file
+        self.__exclusion_cache = {}
+
+        # Last YAML read from/written to this file, and that file's state
+        self.__cached_yaml = None
+        self.__cached_file_state = None
+
 
     def __repr__(self) -> str:
         """Return an unambigious string representation of this object."""
@@ -109,6 +149,27 @@ class SeriesYamlWriter:
                 f'{self.compact_mode=}, {self.volume_map=}>')
 
 
+    @property
+    def __file_state(self) -> tuple[int, int]:
+        """Modification time (in ns) and size of this writer's file."""
+
+        stat = self.file.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+
+    def __cache_yaml(self, yaml: SeriesYaml) -> None:
+        """
+        Cache the given YAML as the current contents of this writer's
+        file, so that it does not need to be re-parsed by the next sync.
+
+        Args:
+            yaml: YAML (dictionary) that was just written to the file.
+        """
+
+        self.__cached_yaml = yaml
+        self.__cached_file_state = self.__file_state
+
+
     def __convert_path(self, path: str, *, media: bool) -> str:
         """
         Convert the given path string to its TCM-equivalent by using
@@ -126,23 +187,75 @@ class SeriesYamlWriter:
             applied, then the original path is returned.
         """
 
+        # Path was previously converted, return that conversion
+        if (path, media) in self.__converted_paths:
+            return self.__converted_paths[(path, media)]
+
         # An override directory has been provided
         if self.card_directory is not None:
             # Path is media, only substitute up to parent directory
             if media:
                 clean_name = CleanPath(path).sanitize().name
-                return str(self.card_directory / clean_name)
+                converted = str(self.card_directory / clean_name)
             # Non-media, override entire directory
-            return str(self.card_directory)
+            else:
+                converted = str(self.card_directory)
+        else:
+            # Use volume map to convert (standardized) path to TCM path; if
+            # there is no defined substitution, use the standardized path
+            converted = str(CleanPath(path).sanitize())
+            for source_base, tcm_base in self.volume_map.items():
+                if converted.startswith(source_base):
+                    converted = tcm_base + converted[len(source_base):]
+                    break
+
+        self.__converted_paths[(path, media)] = converted
+        return converted
+
+
+    def __read_exclusion_file(self, file: str) -> Optional[frozenset[str]]:
+        """
+        Read the series excluded by the given exclusion YAML file. These
+        are cached until the file is modified.
+
+        Args:
+            file: Path (as string) to the exclusion file to read.
+
+        Returns:
+            Set of the (lowercase) names of all excluded series. None if
+            the file cannot be read or is invalid.
+        """
+
+        # Attempt to get file modification time, error and skip if DNE
+        try:
+            mtime = Path(file).stat().st_mtime_ns
+        except Exception as e:
+            log.exception(f'Cannot read "{file}" as exclusion file', e)
+            return None
+
+        # Return cached names if the file is unchanged since the last read
+        if ((cached := self.__exclusion_cache.get(file)) is not None
+            and cached[0] == mtime):
+            return cached[1]
+
+        # Attempt to read file, error and skip if invalid
+        try:
+            with Path(file).open('r', encoding='utf-8') as file_handle:
+                read_yaml = load(file_handle, Loader=ExclusionLoader)
+        except Exception as e:
+            log.exception(f'Cannot read "{file}" as exclusion file', e)
+            return None
+
+        # Get each of the file's specified series
+        if (not isinstance(read_yaml, dict)
+            or not isinstance(all_series := read_yaml.get('series', {}), dict)):
+            log.error(f'Exclusion YAML file "{file}" is invalid')
+            return None
 
-        # Use volume map to convert (standardized) path to TCM path
-        standard_path = str(CleanPath(path).sanitize())
-        for source_base, tcm_base in self.volume_map.items():
-            if standard_path.startswith(source_base):
-                return standard_path.replace(source_base, tcm_base)
+        names = frozenset(str(series).lower() for series in all_series)
+        self.__exclusion_cache[file] = (mtime, names)
 
-        # No defined substitution, return original path
-        return standard_path
+        return names
 
 
     def __apply_exclusion(self,
@@ -151,7 +264,7 @@ class SeriesYamlWriter:
         ) -> None:
         """
         Apply the given exclusions to the given YAML. This modifies the
-        YAML object in-place.
+        YAML object in-place. Series are matched case-insensitively.
 
         Args:
             yaml: YAML being modified.
@@ -159,22 +272,11 @@ class SeriesYamlWriter:
         """
 
         # No exclusions to apply, exit
-        if len(exclusions) == 0 or len(yaml.get('series', {})) == 0:
+        if len(exclusions) == 0 or not (all_series := yaml.get('series')):
             return None
 
-        # Inner function to match case-insentively
-        def yaml_contains(yaml: dict, key: str) -> tuple[bool, str]:
-            # If present under given case
-            if key in yaml.get('series', {}):
-                return True, key
-            # If present in lowercase
-            for yaml_key in yaml.get('series', {}).keys():
-                if str(key).lower() == yaml_key.lower():
-                    return True, yaml_key
-            # Not present at all
-            return False, key
-
-        # Go through each exclusion in the given list
+        # Get the (lowercase) names of all excluded series
+        excluded = set()
         for exclusion in exclusions:
             # Validate this exclusion is a dictionary
             if not isinstance(exclusion, dict):
@@ -182,33 +284,57 @@ class SeriesYamlWriter:
                 continue
 
             # Get exclusion label and value
-            label, value = list(exclusion.items())[0]
+            label, value = next(iter(exclusion.items()))
 
-            # If this exclusion is a YAML file, read and filter each series
+            # If this exclusion is a YAML file, exclude each of its series
             if (label := label.lower()) == 'yaml':
-                # Attempt to read file, error and skip if invalid
-                try:
-                    with Path(value).open('r', encoding='utf-8') as file_handle:
-                        read_yaml = YAML().load(file_handle)
-                except Exception as e:
-                    log.exception(f'Cannot read "{value}" as exclusion file', e)
-                    continue
-
-                # Delete each file's specified series
-                all_series = read_yaml.get('series', {})
-                if not isinstance(all_series, dict):
-                    log.error(f'Exclusion YAML file "{value}" is invalid')
-                    continue
-
-                for series in all_series.keys():
-                    contains, key = yaml_contains(yaml, series)
-                    if contains:
-                        del yaml['series'][key]
-            # If this exclusion is a specific series, remove
+                if (names := self.__read_exclusion_file(value)) is not None:
+                    excluded.update(names)
+            # If this exclusion is a specific series, exclude
             elif label == 'series':
-                contains, key = yaml_contains(yaml, value)
-                if contains:
-                    del yaml['series'][key]
+                excluded.add(str(value).lower())
+
+        # Remove all excluded series
+        yaml['series'] = {
+            key: series for key, series in all_series.items()
+            if key.lower() not in excluded
+        }
+
+
+    def __write_text(self, text: str) -> None:
+        """
+        Write the given text to this Writer's file. The text is written
+        to a temporary file (with the file's mode and ownership) which
+        then replaces the file that this file resolves to, so the file
+        is never partially written. If the file cannot be replaced (e.g.
+        it is a mounted file), it is written directly.
+
+        Args:
+            text: Text to write.
+        """
+
+        # Replace the target of any symlink, not the link itself
+        target = self.file.resolve()
+        if target.exists() and not target.is_file():
+            self.file.write_text(text, encoding='utf-8')
+            return None
+
+        temp_file = target.with_name(f'.{target.name}.tmp')
+        try:
+            temp_file.write_text(text, encoding='utf-8')
+            if target.exists():
+                copymode(target, temp_file)
+                original, temp = target.stat(), temp_file.stat()
+                if (chown is not None
+                    and (original.st_uid, original.st_gid)
+                        != (temp.st_uid, temp.st_gid)):
+                    chown(temp_file, original.st_uid, original.st_gid)
+            replace(temp_file, target)
+        except OSError:
+            temp_file.unlink(missing_ok=True)
+            self.file.write_text(text, encoding='utf-8')
+
+        return None
 
 
     def __write(self, yaml: SeriesYaml) -> None:
@@ -229,8 +355,7 @@ class SeriesYamlWriter:
             }
 
         # Write modified YAML to this writer's file
-        with self.file.open('w', encoding='utf-8') as file_handle:
-            dump(yaml, file_handle, **self.__WRITE_OPTIONS)
+        self.__write_text(dump(yaml, Dumper=Dumper, **self.__WRITE_OPTIONS))
 
 
     def __read_existing_file(self, yaml: SeriesYaml) -> SeriesYaml:
@@ -251,10 +376,15 @@ class SeriesYamlWriter:
             self.__write(yaml)
             return None
 
+        # Reuse the last YAML if the file has not changed since
+        if (self.__cached_yaml is not None
+            and self.__cached_file_state == self.__file_state):
+            return self.__cached_yaml
+
         # Read existing lines/YAML for future parsing
         try:
             with self.file.open('r', encoding='utf-8') as file_handle:
-                existing_yaml = YAML().load(file_handle)
+                existing_yaml = self.__ROUND_TRIP_YAML.load(file_handle)
         except DuplicateKeyError as e:
             log.error(f'Cannot sync to file "{self.file.resolve()}"')
             log.error(f'Invalid YAML encountered {e}')
@@ -292,17 +422,21 @@ class SeriesYamlWriter:
         if (existing_yaml := self.__read_existing_file(yaml)) is None:
             return None
 
+        # Existing libraries and series (both are present after reading)
+        existing_libraries = existing_yaml['libraries']
+        existing_series = existing_yaml['series']
+
         # Identify which libraries DNE in existing YAML that need to be added
         for library_name, library in yaml.get('libraries', {}).items():
             # Skip entries that exist
-            if library_name in existing_yaml.get('libraries', {}).keys():
+            if library_name in existing_libraries:
                 continue
-            existing_yaml['libraries'][library_name] = library
+            existing_libraries[library_name] = library
 
         # Identify which series DNE in existing YAML that need to be aded
         for series_name, series in yaml.get('series', {}).items():
             # Skip entries that already exist
-            if series_name in existing_yaml.get('series', {}).keys():
+            if series_name in existing_series:
                 continue
 
             # If writing compact mode, set flow stype for this entry
@@ -313,11 +447,13 @@ class SeriesYamlWriter:
                 add_obj = series
 
             # Add to YAML
-            existing_yaml['series'][series_name] = add_obj
+            existing_series[series_name] = add_obj
 
         # Write YAML to file
-        with self.file.open('w', encoding='utf-8') as file_handle:
-            round_trip_dump(existing_yaml, file_handle, **self.__WRITE_OPTIONS)
+        self.__write_text(
+            round_trip_dump(existing_yaml, **self.__WRITE_OPTIONS)
+        )
+        self.__cache_yaml(existing_yaml)
 
         return None
 
@@ -337,9 +473,10 @@ class SeriesYamlWriter:
             return None
 
         # Add series that aren't present in existing YAML
+        existing_series = existing_yaml['series']
         for series_name, series in yaml.get('series', {}).items():
             # If this series already exists, skip
-            if series_name in existing_yaml.get('series', {}).keys():
+            if series_name in existing_series:
                 continue
 
             # If writing compact mode, set flow stype for this entry
@@ -350,20 +487,19 @@ class SeriesYamlWriter:
                 add_obj = series
 
             # Series DNE, add to existing YAML
-            existing_yaml['series'][series_name] = add_obj
+            existing_series[series_name] = add_obj
             log.debug(f'Added {series_name} to "{self.file}"')
 
         # Remove series that shouldn't be present in existing YAML
-        existing_series = tuple(existing_yaml.get('series', {}).keys())
-        actual_series = yaml.get('series', {}).keys()
-        for series_name in existing_series:
+        actual_series = yaml.get('series', {})
+        for series_name in tuple(existing_series):
             if series_name not in actual_series:
-                existing_yaml['series'].pop(series_name, None)
+                existing_series.pop(series_name, None)
                 log.debug(f'Removed {series_name} from "{self.file}"')
 
         # Write YAML to file
-        with self.file.open('w', encoding='utf-8') as file_handle:
-            round_trip_dump(existing_yaml, file_handle)
+        self.__write_text(round_trip_dump(existing_yaml))
+        self.__cache_yaml(existing_yaml)
 
         return None
 
@@ -400,20 +536,22 @@ class SeriesYamlWriter:
         """
 
         # Get list of excluded tags
-        excluded_tags = [
-               list(exclusion.items())[0][1] for exclusion in exclusions
-            if list(exclusion.items())[0][0] == 'tag'
-        ]
+        excluded_tags = []
+        for exclusion in exclusions:
+            label, value = next(iter(exclusion.items()))
+            if label == 'tag':
+                excluded_tags.append(value)
 
-        # Get list of SeriesInfo and paths from Sonarr
+        # Get SeriesInfo and paths from Sonarr
         all_series = sonarr_interface.get_all_series(
             required_tags, excluded_tags, monitored_only,
             downloaded_only, series_type,
         )
 
-        # Exit if no series were returned
-        if len(all_series) == 0:
-            return {}
+        # Sort libraries longest path first so nested paths match first
+        sorted_libraries = sorted(
+            plex_libraries.items(), key=lambda kv: len(kv[0]), reverse=True,
+        )
 
         # Generate YAML to write
         series_yaml = {}
@@ -423,11 +561,11 @@ class SeriesYamlWriter:
             sonarr_path = self.__convert_path(sonarr_path, media=True)
 
             # Attempt to find matching Plex library
-            library = None
-            for tcm_base, library_name in plex_libraries.items():
-                if original_path.startswith(tcm_base):
-                    library = library_name
-                    break
+            library = next(
+                (library_name for tcm_base, library_name in sorted_libraries
+                 if original_path.startswith(tcm_base)),
+                None
+            )
 
             # Add details to eventual YAML object
             this_entry = {} if library is None else {'library': library}
@@ -449,6 +587,10 @@ class SeriesYamlWriter:
             # Add this entry to main supposed YAML
             series_yaml[key] = this_entry
 
+        # Exit if no series were returned
+        if not series_yaml:
+            return {}
+
         # Create libraries YAML
         libraries_yaml = {}
         for path, library in plex_libraries.items():
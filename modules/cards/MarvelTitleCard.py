@@ -1,15 +1,40 @@
+from functools import lru_cache
 from pathlib import Path
 from typing import TYPE_CHECKING, Literal, Optional
 
-from modules.BaseCardType import (
-    BaseCardType, Coordinate, ImageMagickCommands, Rectangle,
-)
+from modules.BaseCardType import BaseCardType, ImageMagickCommands
 from modules.ImageMagickInterface import Dimensions
 
 if TYPE_CHECKING:
     from modules.Font import Font
 
 
+@lru_cache(maxsize=None)
+def _border_draws(width: int, height: int, border_size: int) -> tuple[str, ...]:
+    """
+    Get the draw commands for the left, top, and right borders of a card
+    with the given dimensions and border size.
+    """
+
+    return (
+        f'-draw "rectangle 0,0,{border_size:.0f},{height:.0f}"',
+        f'-draw "rectangle 0,0,{width:.0f},{border_size:.0f}"',
+        f'-draw "rectangle {width - border_size:.0f},0,'
+            f'{width:.0f},{height:.0f}"',
+    )
+
+
+@lru_cache(maxsize=None)
+def _text_box_draw(width: int, height: int, text_box_height: int) -> str:
+    """
+    Get the draw command for the text box at the bottom of a card with
+    the given dimensions and text box height.
+    """
+
+    return (f'-draw "rectangle 0,{height - text_box_height:.0f},'
+            f'{width:.0f},{height:.0f}"')
+
+
 class MarvelTitleCard(BaseCardType):
     """
     This class describes a CardType that produces title cards intended
@@ -35,9 +60,16 @@ class MarvelTitleCard(BaseCardType):
     DEFAULT_FONT_CASE = 'upper'
     FONT_REPLACEMENTS = {}
 
+    """Default font color, file, spacings, kerning, size, and shift"""
+    __DEFAULT_FONT = (TITLE_COLOR, TITLE_FONT, 0, 0, 1.0, 1.0, 0)
+
     """Characteristics of the episode text"""
     EPISODE_TEXT_COLOR = '#C9C9C9'
     EPISODE_TEXT_FONT = REF_DIRECTORY / 'Qualion ExtraBold.ttf'
+    __EPISODE_TEXT_FONT = str(EPISODE_TEXT_FONT.resolve())
+
+    """Standard episode text format, as compared for custom season titles"""
+    __STANDARD_EPISODE_TEXT_FORMAT = BaseCardType.EPISODE_TEXT_FORMAT.upper()
 
     """Whether this CardType uses season titles for archival purposes"""
     USES_SEASON_TITLE = True
@@ -57,6 +89,9 @@ class MarvelTitleCard(BaseCardType):
     """Height of the text box (in pixels)"""
     DEFAULT_TEXT_BOX_HEIGHT = 200
 
+    """Joined image (non-text) commands, keyed by the attributes they use"""
+    __image_commands_cache = {}
+
     __slots__ = (
         'source_file', 'output_file', 'title_text', 'season_text',
         'episode_text', 'hide_season_text', 'hide_episode_text', 'font_file',
@@ -64,7 +99,8 @@ class MarvelTitleCard(BaseCardType):
         'font_interword_spacing', 'font_kerning', 'font_vertical_shift',
         'border_color', 'border_size', 'episode_text_color', 'fit_text',
         'episode_text_position', 'hide_border', 'text_box_color',
-        'text_box_height', 'font_size_modifier',
+        'text_box_height', 'font_size_modifier', '__source', '__output',
+        '__inner_width',
     )
 
     def __init__(self, *,
@@ -102,6 +138,11 @@ class MarvelTitleCard(BaseCardType):
 
         self.source_file = source_file
         self.output_file = card_file
+        # Paths are usually already absolute, only resolve if not
+        self.__source = str(source_file if source_file.is_absolute()
+                            else source_file.resolve())
+        self.__output = str(card_file if card_file.is_absolute()
+                            else card_file.resolve())
 
         # Ensure characters that need to be escaped are
         self.title_text = self.image_magick.escape_chars(title_text)
@@ -130,6 +171,9 @@ class MarvelTitleCard(BaseCardType):
         self.text_box_color = text_box_color
         self.text_box_height = text_box_height
 
+        # Width of the image within the left and right borders
+        self.__inner_width = self.WIDTH - (2 * border_size)
+
 
     @property
     def title_text_commands(self) -> ImageMagickCommands:
@@ -178,31 +222,26 @@ class MarvelTitleCard(BaseCardType):
         if self.hide_season_text:
             return []
 
-        # Vertical positioning of text
-        y_position = 810 + self.font_vertical_shift
-
-        text_command = []
+        # Positioning of text, as signed whole-pixel offsets
+        y_position = f'{810 + self.font_vertical_shift:+.0f}'
         if self.episode_text_position == 'compact':
+            gravity = 'east'
             x_position = (self.WIDTH + title_text_dimensions.width) / 2 + 20
-            text_command = [
-                f'-gravity east',
-                f'-annotate {x_position:+}{y_position:+} "{self.season_text}"',
-            ]
+            x_position = f'{x_position:+.0f}'
         else:
-            text_command = [
-                f'-gravity west',
-                f'-annotate +{self.border_size}{y_position:+} "{self.season_text}"',
-            ]
+            gravity = 'west'
+            x_position = f'+{self.border_size}'
 
         font_size = 70 * self.font_size_modifier
 
         return [
-            f'-font "{self.EPISODE_TEXT_FONT.resolve()}"',
+            f'-font "{self.__EPISODE_TEXT_FONT}"',
             f'-fill "{self.episode_text_color}"',
             f'-pointsize {font_size}',
             f'-kerning 1',
             f'-interword-spacing 15',
-            *text_command,
+            f'-gravity {gravity}',
+            f'-annotate {x_position}{y_position} "{self.season_text}"',
         ]
 
 
@@ -224,35 +263,34 @@ class MarvelTitleCard(BaseCardType):
         if self.hide_episode_text:
             return []
 
-        # Vertical positioning of text
-        y_position = 810 + self.font_vertical_shift
-
-        text_command = []
+        # Positioning of text, as signed whole-pixel offsets
+        y_position = f'{810 + self.font_vertical_shift:+.0f}'
         if self.episode_text_position == 'compact':
+            gravity = 'west'
             x_position = (self.WIDTH + title_text_dimensions.width) / 2 + 20
-            text_command = [
-                f'-gravity west',
-                f'-annotate {x_position:+}{y_position:+} "{self.episode_text}"',
-            ]
+            x_position = f'{x_position:+.0f}'
         else:
-            text_command = [
-                f'-gravity east',
-                f'-annotate +{self.border_size}{y_position:+} "{self.episode_text}"',
-            ]
+            gravity = 'east'
+            x_position = f'+{self.border_size}'
 
         font_size = 70 * self.font_size_modifier
 
         return [
-            f'-font "{self.EPISODE_TEXT_FONT.resolve()}"',
+            f'-font "{self.__EPISODE_TEXT_FONT}"',
             f'-fill "{self.episode_text_color}"',
             f'-pointsize {font_size}',
             f'-kerning 1',
             f'-interword-spacing 15',
-            *text_command,
+            f'-gravity {gravity}',
+            f'-annotate {x_position}{y_position} "{self.episode_text}"',
         ]
 
 
-    def scale_text(self, title_text_dimensions: Dimensions) -> Dimensions:
+    def scale_text(self,
+            title_text_dimensions: Dimensions,
+            season_commands: ImageMagickCommands,
+            episode_commands: ImageMagickCommands,
+        ) -> Dimensions:
         """
         Set the font size modifier to scale the title and index text and
         ensure it fits in the image.
@@ -260,6 +298,8 @@ class MarvelTitleCard(BaseCardType):
         Args:
             title_text_dimensions: Dimensions of the title text for
                 determining the scaling factor.
+            season_commands: Unscaled season text commands.
+            episode_commands: Unscaled episode text commands.
 
         Returns:
             New dimensions of the title text. If `fit_text` is False,
@@ -273,12 +313,10 @@ class MarvelTitleCard(BaseCardType):
 
         # Get dimensions of season and episode text
         season_text_dimensions = self.get_text_dimensions(
-            self.season_text_commands(title_text_dimensions),
-            width='sum', height='sum',
+            season_commands, width='sum', height='sum',
         )
         episode_text_dimensions = self.get_text_dimensions(
-            self.episode_text_commands(title_text_dimensions),
-            width='sum', height='sum',
+            episode_commands, width='sum', height='sum',
         )
 
         # Check left/right separately for overlap
@@ -291,7 +329,7 @@ class MarvelTitleCard(BaseCardType):
         right_width += 0 if self.hide_episode_text else 40
 
         # If either side is too wide, scale by largest size
-        max_width = (self.WIDTH / 2) - self.border_size
+        max_width = self.__inner_width / 2
         if left_width > max_width or right_width > max_width:
             self.font_size_modifier = min(
                 max_width / left_width,
@@ -300,6 +338,13 @@ class MarvelTitleCard(BaseCardType):
 
         # If font scalar was modified, recalculate+return text dimensions
         if self.font_size_modifier < 1.0:
+            # Size and kerning both scale with the modifier, so unless a
+            # fixed interword spacing is set, the dimensions scale linearly
+            if self.font_interword_spacing == 0:
+                return Dimensions(
+                    title_text_dimensions.width * self.font_size_modifier,
+                    title_text_dimensions.height * self.font_size_modifier,
+                )
             return self.get_text_dimensions(
                 self.title_text_commands, width='max', height='sum',
             )
@@ -316,25 +361,9 @@ class MarvelTitleCard(BaseCardType):
         if self.hide_border:
             return []
 
-        # Get each rectangle
-        left_rectangle = Rectangle(
-            Coordinate(0, 0),
-            Coordinate(self.border_size, self.HEIGHT)
-        )
-        top_rectangle = Rectangle(
-            Coordinate(0, 0),
-            Coordinate(self.WIDTH, self.border_size)
-        )
-        right_rectangle = Rectangle(
-            Coordinate(self.WIDTH - self.border_size, 0),
-            Coordinate(self.WIDTH, self.HEIGHT)
-        )
-
         return [
             f'-fill "{self.border_color}"',
-            left_rectangle.draw(),
-            top_rectangle.draw(),
-            right_rectangle.draw(),
+            *_border_draws(self.WIDTH, self.HEIGHT, self.border_size),
         ]
 
 
@@ -342,17 +371,47 @@ class MarvelTitleCard(BaseCardType):
     def bottom_border_commands(self) -> ImageMagickCommands:
         """Subcommands to add the bottom border to the image."""
 
-        rectangle = Rectangle(
-            Coordinate(0, self.HEIGHT - self.text_box_height),
-            Coordinate(self.WIDTH, self.HEIGHT)
-        )
-
         return [
             f'-fill "{self.text_box_color}"',
-            rectangle.draw(),
+            _text_box_draw(self.WIDTH, self.HEIGHT, self.text_box_height),
         ]
 
 
+    @property
+    def image_commands(self) -> tuple[str, str]:
+        """
+        Joined subcommands to style, resize, and add the borders to the
+        source image, and to resize the output. These do not depend on
+        the text, so they are cached across all cards which share these
+        attributes.
+
+        Returns:
+            Tuple of the (joined) commands before and after the text.
+        """
+
+        key = (
+            self.blur, self.grayscale, self.border_color, self.border_size,
+            self.hide_border, self.text_box_color, self.text_box_height,
+            self.preferences.card_dimensions,
+        )
+        if (commands := self.__image_commands_cache.get(key)) is None:
+            commands = self.__image_commands_cache[key] = (
+                ' '.join([
+                    # Resize and apply styles to source image
+                    *self.resize_and_style,
+                    # Resize to only fit in the bounds of the border
+                    f'-resize {self.__inner_width}x',
+                    f'-extent {self.TITLE_CARD_SIZE}',
+                    # Add borders
+                    *self.border_commands,
+                    *self.bottom_border_commands,
+                ]),
+                ' '.join(self.resize_output),
+            )
+
+        return commands
+
+
     @staticmethod
     def modify_extras(
             extras: dict,
@@ -405,13 +464,9 @@ class MarvelTitleCard(BaseCardType):
         )
 
         return (custom_extras
-            or ((font.color != MarvelTitleCard.TITLE_COLOR)
-            or (font.file != MarvelTitleCard.TITLE_FONT)
-            or (font.interline_spacing != 0)
-            or (font.interword_spacing != 0)
-            or (font.kerning != 1.0)
-            or (font.size != 1.0)
-            or (font.vertical_shift != 0))
+            or (font.color, font.file, font.interline_spacing,
+                font.interword_spacing, font.kerning, font.size,
+                font.vertical_shift) != MarvelTitleCard.__DEFAULT_FONT
         )
 
 
@@ -432,10 +487,9 @@ class MarvelTitleCard(BaseCardType):
             True if custom season titles are indicated, False otherwise.
         """
 
-        standard_etf = MarvelTitleCard.EPISODE_TEXT_FORMAT.upper()
-
         return (custom_episode_map
-                or episode_text_format.upper() != standard_etf)
+                or episode_text_format.upper()
+                    != MarvelTitleCard.__STANDARD_EPISODE_TEXT_FORMAT)
 
 
     def create(self) -> None:
@@ -445,30 +499,40 @@ class MarvelTitleCard(BaseCardType):
         """
 
         # Get the dimensions of the title and index text
+        title_text_commands = self.title_text_commands
         title_text_dimensions = self.get_text_dimensions(
-            self.title_text_commands, width='max', height='sum',
+            title_text_commands, width='max', height='sum',
+        )
+
+        # Get the season and episode text commands at this size
+        season_commands = self.season_text_commands(title_text_dimensions)
+        episode_commands = self.episode_text_commands(title_text_dimensions)
+
+        # Apply any font scaling to fit text; only rebuild text if scaled
+        title_text_dimensions = self.scale_text(
+            title_text_dimensions, season_commands, episode_commands,
         )
+        if self.font_size_modifier != 1.0:
+            title_text_commands = self.title_text_commands
+            season_commands = self.season_text_commands(title_text_dimensions)
+            episode_commands = self.episode_text_commands(title_text_dimensions)
+
+        # Get the commands which do not depend on the text
+        image_commands, output_commands = self.image_commands
 
-        # Apply any font scaling to fit text
-        title_text_dimensions = self.scale_text(title_text_dimensions)
-
-        command = ' '.join([
-            f'convert "{self.source_file.resolve()}"',
-            # Resize and apply styles to source image
-            *self.resize_and_style,
-            # Resize to only fit in the bounds of the border
-            f'-resize {self.WIDTH - (2 * self.border_size)}x',
-            f'-extent {self.TITLE_CARD_SIZE}',
-            # Add borders
-            *self.border_commands,
-            *self.bottom_border_commands,
+        # Only the text commands still need joining
+        text_commands = ' '.join(
+            title_text_commands + season_commands + episode_commands
+        )
+
+        command = (
+            f'convert "{self.__source}" '
+            # Resize, style, and add borders to the source image
+            f'{image_commands} '
             # Add text
-            *self.title_text_commands,
-            *self.season_text_commands(title_text_dimensions),
-            *self.episode_text_commands(title_text_dimensions),
+            f'{text_commands} '
             # Create card
-            *self.resize_output,
-            f'"{self.output_file.resolve()}"',
-        ])
+            f'{output_commands} "{self.__output}"'
+        )
 
         self.image_magick.run(command)